@@ -36,23 +36,40 @@ def get_today_version():
 
 __version__ = get_today_version()
 
-from tqdm import tqdm
-import tempfile
 import os
+import posixpath
 import time
 import shutil
-import webbrowser
-import paramiko
 import json
 from getpass import getpass
 import sys
-import glob
-from datetime import datetime
 import socket
 import platform
-import urllib.request
 import hashlib
+import heapq
+import atexit
+import signal
 import threading
+import shlex
+import queue
+from collections import deque
+
+# 装了 orjson 就用它序列化/解析 JSON，否则退回标准库 json，输出格式保持一致
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_dumps(obj, indent=True):
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
+
+def json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 # 统一配置文件路径，支持 macOS/Linux/Windows
 from pathlib import Path
@@ -64,12 +81,61 @@ else:
 # 默认 dist 目录
 DEFAULT_DIST = "dist"
 
+# 一条配置必须填写的字段；另外 password、key_path、use_agent 至少要有一种认证方式
+REQUIRED_CONFIG_FIELDS = ("name", "host", "port", "username", "remote_path", "local_dist", "test_url")
+
+# 逐文件 SFTP 上传时并发的通道数，可在单条配置里用 sftp_workers 覆盖。
+# OpenSSH 默认 MaxSessions 为 10，留出 tar 流和 mkdir 用的通道
+SFTP_WORKERS = 8
+
+# 同一个 SSH 连接上允许同时打开的会话数（OpenSSH 默认 MaxSessions）；
+# sftp_workers 配得再大，SFTP 通道也只占到 SSH_MAX_SESSIONS - 2，给 tar 流留出位置
+SSH_MAX_SESSIONS = 10
+
+# SFTP 通道的接收窗口和最大包大小
+SFTP_WINDOW_SIZE = 2147483647
+SFTP_MAX_PACKET_SIZE = 1 << 19
+
+# 每个 SFTP 写请求携带的数据量。paramiko 默认 32KiB，OpenSSH 的 sftp-server 单条消息上限 256KiB；
+# 请求越大，同样的数据需要的请求、应答和 paramiko 内部的切片拷贝就越少
+SFTP_WRITE_REQUEST_SIZE = 1 << 17
+
+# 视为本机的 host，配合 local_copy 选项直接本地复制
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+# 部署时写在远端目录里的内容哈希清单，下次部署据此只上传内容变化的文件
+MANIFEST_NAME = '.sshcdm-manifest.json'
+
+# 逐文件 SFTP 上传时先写入的临时文件后缀，传完再改名为正式文件名；
+# 临时文件名里带上本地内容哈希，见 part_path
+PART_SUFFIX = '.sshcdm-part'
+
+# 小于该大小的文件在远端有 tar 时合并成一个 tar 流上传
+SMALL_FILE_SIZE = 64 * 1024
+
+# 上传时每次从本地读取的块大小
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# 升级脚本时每次从网络读取的块大小
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
 # 历史记录目录
 HISTORY_DIR = str(Path.home() / '.deploy_dist_history')
 os.makedirs(HISTORY_DIR, exist_ok=True)
 
-# 菜单操作历史记录文件
-MENU_HISTORY_FILE = str(Path.home() / '.deploy_dist_menu_history.json')
+# 查看/删除历史记录时列出的最近条数
+HISTORY_LIST_LIMIT = 50
+
+# 远端版本检查的条件请求缓存（ETag/Last-Modified 和上次解析到的版本号）
+REMOTE_VERSION_CACHE_FILE = str(Path.home() / '.deploy_dist_remote_version.json')
+
+# 本地脚本哈希缓存，检查更新时脚本未变化就不必重新计算
+LAST_HASH_FILE = str(Path.home() / '.deploy_dist_last_hash')
+
+# 菜单操作历史记录文件（JSON Lines，每行一条）
+MENU_HISTORY_FILE = str(Path.home() / '.deploy_dist_menu_history.jsonl')
+# 旧版本的菜单历史文件，启动时迁移到 MENU_HISTORY_FILE
+LEGACY_MENU_HISTORY_FILE = str(Path.home() / '.deploy_dist_menu_history.json')
 
 # 配置结构示例：
 # {
@@ -78,25 +144,136 @@ MENU_HISTORY_FILE = str(Path.home() / '.deploy_dist_menu_history.json')
 #   "port": 22,
 #   "username": "...",
 #   "password": "...",
+#   "key_path": "~/.ssh/id_ed25519",  # 可选，配置后用私钥认证，password 可留空
+#   "key_passphrase": "...", # 可选，私钥口令
+#   "use_agent": false,      # 可选，为 true 时允许使用 ssh-agent
 #   "remote_path": "...",
 #   "local_dist": "dist",
-#   "test_url": "..."
+#   "test_url": "...",
+#   "sftp_workers": 8,       # 可选，逐文件 SFTP 上传的并发通道数
+#   "force_upload": false,   # 可选，为 true 时不比较大小/修改时间，全部重新上传
+#   "keep_dist": true,       # 可选，设为 false 时部署成功后删除本地 dist 目录
+#   "backend": "asyncssh",   # 可选，大文件改用 asyncssh 上传（需 pip install asyncssh）
+#   "local_copy": true       # 可选，host 为本机时直接本地复制，不经过 SSH
 # }
 
+# load_configs 的缓存：配置文件的 mtime/大小未变化时直接返回上次解析结果
+_CONFIGS_CACHE = {'mtime': None, 'data': None}
+
+def _config_file_stamp():
+    st = os.stat(CONFIG_FILE)
+    return (st.st_mtime_ns, st.st_size)
+
 def load_configs():
-    if not os.path.exists(CONFIG_FILE):
+    try:
+        stamp = _config_file_stamp()
+    except FileNotFoundError:
         return []
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    if _CONFIGS_CACHE['data'] is not None and _CONFIGS_CACHE['mtime'] == stamp:
+        return _CONFIGS_CACHE['data']
+    with open(CONFIG_FILE, 'rb') as f:
+        data = json_loads(f.read())
+    _CONFIGS_CACHE['mtime'] = stamp
+    _CONFIGS_CACHE['data'] = data
+    return data
+
+def write_file_atomic(path, data):
+    # 先写同目录下的临时文件，fsync 后再 os.replace，中途崩溃也不会留下被截断的文件
+    # 配置文件里有明文密码：临时文件一开始就是 0600，已有文件的权限原样沿用；
+    # 目标是软链接（统一管理的 dotfile）时替换链接指向的文件，链接本身保留
+    path = os.path.realpath(path)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = None
+    try:
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
 
 def save_configs(configs):
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(configs, f, indent=2, ensure_ascii=False)
+    write_file_atomic(CONFIG_FILE, json_dumps(configs))
+    _CONFIGS_CACHE['mtime'] = _config_file_stamp()
+    _CONFIGS_CACHE['data'] = configs
+
+class ConfigStore:
+    # 主菜单持有的一份内存配置列表：各分支直接读写 items，修改后调用 save()；
+    # save() 只做标记，flush() 时才写盘，一次会话里多次修改只写一次文件；
+    # 每次重画菜单时 refresh() 只比较配置文件的 mtime/大小，被外部改过才重新读取
+    def __init__(self):
+        self.items = []
+        self._stamp = None
+        self._dirty = False
+        self.reload()
+
+    def _file_stamp(self):
+        try:
+            return _config_file_stamp()
+        except FileNotFoundError:
+            return None
+
+    def reload(self):
+        self.items = load_configs()
+        self._stamp = self._file_stamp()
+
+    def refresh(self):
+        # 有未写盘的修改时以内存为准，不被磁盘上的旧内容覆盖
+        if not self._dirty and self._file_stamp() != self._stamp:
+            self.reload()
+
+    def save(self):
+        self._dirty = True
+
+    def flush(self):
+        if self._dirty:
+            save_configs(self.items)
+            self._stamp = self._file_stamp()
+            self._dirty = False
+
+def read_pasted_json():
+    # 终端下一直读到 EOF（Ctrl-D），管道输入时只读一行
+    pasted = sys.stdin.read() if sys.stdin.isatty() else input()
+    return json_loads(pasted)
+
+def missing_config_fields(cfg):
+    missing = [f for f in REQUIRED_CONFIG_FIELDS if not cfg.get(f)]
+    if not (cfg.get('password') or cfg.get('key_path') or cfg.get('use_agent')):
+        missing.append('password')
+    return missing
 
 def input_config(default=None):
     # default: dict, 用于回显和默认值
     if default is None:
         default = {}
+    # 粘贴模式：一次读入整条 JSON 配置，合并到默认值上，省去逐项输入
+    if input("输入 P 粘贴整块 JSON 快速输入，直接回车逐项输入: ").strip().lower() == 'p':
+        print("请粘贴一份单条配置（JSON 对象）：")
+        try:
+            pasted = read_pasted_json()
+            if not isinstance(pasted, dict):
+                raise ValueError('不是 JSON 对象')
+            cfg = dict(default, **pasted)
+            cfg['port'] = int(cfg.get('port') or 22)
+            cfg['local_dist'] = cfg.get('local_dist') or DEFAULT_DIST
+            missing = missing_config_fields(cfg)
+            if not missing:
+                return cfg
+            # 缺字段时用粘贴的内容作默认值逐项补齐，避免残缺配置被保存
+            print(f"粘贴的配置缺少字段: {missing}，改为逐项输入。")
+            default = cfg
+        except Exception as e:
+            print(f"粘贴内容格式错误: {e}，改为逐项输入。")
     def get_input(prompt, key, hide=False, default_val=None):
         if hide:
             val = getpass(f"{prompt} (留空默认[{default.get(key, default_val) or ''}]): ")
@@ -109,85 +286,632 @@ def input_config(default=None):
     host = get_input("服务器IP", "host")
     port = get_input("端口", "port", default_val="22") or "22"
     username = get_input("用户名", "username")
-    password = get_input("密码", "password", hide=True)
+    password = get_input("密码（使用私钥时可留空）", "password", hide=True)
+    key_path = get_input("私钥路径（可选）", "key_path")
     remote_path = get_input("服务器目标目录", "remote_path")
     local_dist = get_input(f"本地dist目录", "local_dist", default_val=DEFAULT_DIST) or DEFAULT_DIST
     test_url = get_input("测试URL", "test_url")
-    return {
+    # 在原配置上只改逐项输入过的字段，key_passphrase、use_agent、backend 等可选项原样保留
+    cfg = dict(default)
+    cfg.update({
         "name": name,
         "host": host,
         "port": int(port),
         "username": username,
         "password": password,
+        "key_path": key_path,
         "remote_path": remote_path,
         "local_dist": local_dist,
         "test_url": test_url
-    }
+    })
+    return cfg
 
 def select_config(configs):
     if not configs:
         print("没有可用配置，请先新增配置！")
-        return None
+        return None, None
     print("请选择要使用的配置：")
     for i, c in enumerate(configs):
         print(f"{i+1}. {c['name']} [{c['host']}] ({c['remote_path']})")
-    idx = input("输入序号: ")
+    idx = parse_index(input("输入序号: "), len(configs))
+    if idx is None:
+        print("无效选择！")
+        return None, None
+    return idx, configs[idx]
+
+def check_dist(path):
+    # 部署前用户已经打包完成，检查一次即可，不再轮询等待
+    if os.path.isdir(path):
+        return True
+    print(f"当前本地 dist 目录({path})不存在，请先执行打包命令。")
+    return False
+
+def collect_files(local_dir, remote_dir):
+    # 用 os.scandir 单次遍历本地目录，同时得到文件列表和需要的远端目录
+    all_files = []
+    remote_dirs = []
+    stack = [(local_dir, remote_dir)]
+    while stack:
+        local_path, remote_path = stack.pop()
+        remote_dirs.append(remote_path)
+        # 每个目录只算一次远端前缀，循环里直接拼接，不再逐个调用 posixpath.join
+        prefix = remote_path.rstrip('/') + '/'
+        with os.scandir(local_path) as it:
+            for entry in it:
+                remote_entry = prefix + entry.name
+                # 类型用 readdir 返回的 d_type 判断，不额外 stat；指向目录的符号链接不展开（与 os.walk 默认一致）
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, remote_entry))
+                elif entry.is_file():
+                    all_files.append((entry.path, remote_entry, entry.stat().st_size))
+    return all_files, remote_dirs
+
+def remote_has_command(ssh, name):
     try:
-        idx = int(idx) - 1
-        if 0 <= idx < len(configs):
-            return configs[idx]
+        _, stdout, _ = ssh.exec_command(f'command -v {name}')
+        return stdout.channel.recv_exit_status() == 0
     except Exception:
-        pass
-    print("无效选择！")
-    return None
+        return False
+
+def remote_has_tar(ssh):
+    # 远端是否可用 tar，不可用时小文件也逐个走 SFTP 上传
+    return remote_has_command(ssh, 'tar')
 
-def wait_for_dist(path, timeout=600):
-    if not os.path.exists(path):
-        print(f"当前本地 dist 目录({path})不存在，请先执行打包命令。")
+def tar_use_zstd(ssh):
+    # 本地装了 zstandard 且远端有 zstd 命令时，tar 流改用 zstd 压缩：压缩率和速度都好于 gzip
+    try:
+        import zstandard
+    except ImportError:
         return False
-    print("等待 dist 目录生成...")
-    for _ in range(timeout):
-        if os.path.isdir(path):
-            print("dist 目录已生成。")
-            return True
-        time.sleep(1)
-    print("等待 dist 超时！")
-    return False
+    return remote_has_command(ssh, 'zstd')
 
-def get_total_files(local_dir):
-    total = 0
-    for _, _, files in os.walk(local_dir):
-        total += len(files)
-    return total
+class _ProgressWriter:
+    # 包装写入函数，每写一块就把字节数报告给进度回调
+    def __init__(self, write, progress):
+        self._write = write
+        self._progress = progress
 
-def sftp_upload(local_dir, remote_dir, ssh):
-    print(f"开始上传 {local_dir} 到 {remote_dir} ...")
-    sftp = ssh.open_sftp()
-    total_files = get_total_files(local_dir)
-    uploaded = 0
-    for root, dirs, files in os.walk(local_dir):
-        rel_path = os.path.relpath(root, local_dir)
-        remote_path = os.path.join(remote_dir, rel_path).replace("\\", "/")
+    def write(self, data):
+        self._write(data)
+        self._progress(len(data))
+        return len(data)
+
+class _ProgressReader:
+    # 包装读取对象，每读一块就把字节数报告给进度回调
+    def __init__(self, f, progress):
+        self._f = f
+        self._progress = progress
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self._progress(len(data))
+        return data
+
+class _ChannelWriter:
+    # tarfile 只需要 write()，直接发到 SSH 通道，不经过 paramiko 的文件对象
+    def __init__(self, channel):
+        self.channel = channel
+
+    def write(self, data):
+        self.channel.sendall(data)
+        return len(data)
+
+def tar_upload(files, remote_dir, ssh, progress, file_done=None, zstd=False):
+    import tarfile
+    # 把一批文件打成一个 tar 流经 SSH 管道传输，远端直接解包，避免逐文件往返
+    target = shlex.quote(remote_dir)
+    if zstd:
+        import zstandard
+        stdin, stdout, stderr = ssh.exec_command(f'zstd -dc | tar xf - -C {target}')
+        out = zstandard.ZstdCompressor(level=3, threads=-1).stream_writer(_ChannelWriter(stdin.channel))
+        mode = 'w|'
+    else:
+        stdin, stdout, stderr = ssh.exec_command(f'tar xzf - -C {target}')
+        out = _ChannelWriter(stdin.channel)
+        mode = 'w|gz'
+    # dereference：软链接的小文件按目标内容打包，和逐文件 SFTP 上传的结果一致
+    with tarfile.open(fileobj=out, mode=mode, dereference=True) as tar:
+        for local_file, remote_file, _ in files:
+            info = tar.gettarinfo(local_file, arcname=remote_file[len(remote_dir):].lstrip('/'))
+            # 远端 tar 会还原归档里的属主和权限（root 解包时尤其如此），统一成 root、0644，
+            # 和 SFTP 新建的文件一样，避免本地 0600 或其它 uid 的文件在服务器上 Web 服务读不了
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+            info.mode = 0o644
+            with open(local_file, 'rb') as f:
+                tar.addfile(info, _ProgressReader(f, progress))
+            if file_done:
+                file_done()
+    if zstd:
+        # 写出 zstd 帧尾
+        out.close()
+    stdin.channel.shutdown_write()
+    status = stdout.channel.recv_exit_status()
+    if status != 0:
+        err = stderr.read().decode('utf-8', 'replace').strip()
+        raise IOError(f"远端解包失败(exit {status}): {err}")
+
+def tune_transport(ssh):
+    # 放大 SSH 窗口并推迟密钥重协商，避免大文件上传被小窗口限速
+    transport = ssh.get_transport()
+    transport.default_window_size = SFTP_WINDOW_SIZE
+    transport.default_max_packet_size = SFTP_MAX_PACKET_SIZE
+    transport.packetizer.REKEY_BYTES = pow(2, 40)
+    transport.packetizer.REKEY_PACKETS = pow(2, 40)
+
+def open_tcp_socket(host, port, timeout):
+    # 自己建 TCP 连接交给 paramiko：关掉 Nagle，避免 SFTP 的小请求被攒包延迟；
+    # 收发缓冲区不手动设置，保留内核的自动调优（显式设置反而会关掉自动调优）
+    sock = socket.create_connection((host, port), timeout=timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    return sock
+
+def open_sftp(ssh):
+    # 显式指定窗口和最大包大小来开 SFTP 通道，而不是用 open_sftp() 的默认值
+    import paramiko
+    chan = ssh.get_transport().open_session(window_size=SFTP_WINDOW_SIZE,
+                                            max_packet_size=SFTP_MAX_PACKET_SIZE)
+    chan.invoke_subsystem('sftp')
+    # 大文件写入时不因单次等待超时而中断
+    chan.settimeout(None)
+    return paramiko.SFTPClient(chan)
+
+# 已认证的 SSH 连接池，按 ssh_pool_key() 复用；同一次运行里重复部署/测试不必重新握手
+# 值为 (ssh, 上次使用时间)，闲置超过 SSH_POOL_IDLE_TTL 秒的连接丢弃重连，类似 ControlPersist
+SSH_POOL_IDLE_TTL = 600
+_SSH_POOL = {}
+_SSH_POOL_LOCK = threading.Lock()
+
+# 已解析的私钥，按 (路径, 口令) 缓存；带口令的私钥每次运行只需解密一次，口令不对的配置也不会命中别人的缓存
+_PKEY_CACHE = {}
+
+def ssh_pool_key(config):
+    # 认证信息也算进键里：同一主机账号换了密码或私钥时不会误用旧连接（批量导入校验依赖这一点）
+    return (config['host'], int(config['port']), config['username'], config.get('password') or None,
+            config.get('key_path') or None, config.get('key_passphrase') or None,
+            bool(config.get('use_agent')))
+
+def load_private_key(path, passphrase=None):
+    # PKey.from_path 按文件内容识别 Ed25519/ECDSA/RSA 等类型
+    import paramiko
+    path = os.path.expanduser(path)
+    cache_key = (path, passphrase)
+    pkey = _PKEY_CACHE.get(cache_key)
+    if pkey is None:
+        if hasattr(paramiko.PKey, 'from_path'):
+            # from_path 交给 cryptography 解密，口令必须是 bytes
+            pkey = paramiko.PKey.from_path(path, passphrase.encode() if passphrase else None)
+        else:
+            # paramiko 3.2 之前没有 from_path，依次尝试常见的私钥类型
+            for key_class in (paramiko.Ed25519Key, paramiko.ECDSAKey, paramiko.RSAKey):
+                try:
+                    pkey = key_class.from_private_key_file(path, password=passphrase)
+                    break
+                except paramiko.SSHException:
+                    continue
+            else:
+                raise paramiko.SSHException(f"无法识别的私钥: {path}")
+        _PKEY_CACHE[cache_key] = pkey
+    return pkey
+
+def get_ssh(config, timeout=15, banner_timeout=10):
+    import paramiko
+    key = ssh_pool_key(config)
+    now = time.monotonic()
+    with _SSH_POOL_LOCK:
+        ssh, last_used = _SSH_POOL.get(key, (None, None))
+        if ssh is not None and now - last_used < SSH_POOL_IDLE_TTL:
+            transport = ssh.get_transport()
+            if transport is not None and transport.is_active():
+                _SSH_POOL[key] = (ssh, now)
+                return ssh
+    if ssh is not None:
+        ssh.close()
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    sock = open_tcp_socket(config['host'], int(config['port']), timeout)
+    try:
+        # 配了 key_path 时用私钥认证（公钥签名校验比服务端的密码校验快，也不用明文存密码）；
+        # use_agent 为 true 时允许使用正在运行的 ssh-agent
+        pkey = None
+        if config.get('key_path'):
+            pkey = load_private_key(config['key_path'], config.get('key_passphrase') or None)
+        ssh.connect(
+            hostname=config['host'],
+            port=int(config['port']),
+            sock=sock,
+            username=config['username'],
+            password=config.get('password') or None,
+            pkey=pkey,
+            timeout=timeout,
+            banner_timeout=banner_timeout,
+            look_for_keys=False,
+            allow_agent=bool(config.get('use_agent')),
+            compress=True
+        )
+    except Exception:
+        ssh.close()
+        sock.close()
+        raise
+    tune_transport(ssh)
+    # 连接放在池里会闲置较久，定期发 keepalive 防止被中间设备断开
+    ssh.get_transport().set_keepalive(30)
+    with _SSH_POOL_LOCK:
+        old, _ = _SSH_POOL.get(key, (None, None))
+        _SSH_POOL[key] = (ssh, time.monotonic())
+    if old is not None and old is not ssh:
+        old.close()
+    return ssh
+
+def close_ssh_pool():
+    with _SSH_POOL_LOCK:
+        clients = [ssh for ssh, _ in _SSH_POOL.values()]
+        _SSH_POOL.clear()
+    for ssh in clients:
         try:
-            sftp.stat(remote_path)
+            ssh.close()
+        except Exception:
+            pass
+
+atexit.register(close_ssh_pool)
+
+def make_remote_dirs(ssh, sftp, remote_dirs, existing=()):
+    # 一次 mkdir -p 建好整棵远端目录树；远端不给 shell 时退回逐个 sftp.mkdir
+    # existing 是本次已确认存在的目录，直接跳过；全部存在时不再发任何请求
+    remote_dirs = [d for d in remote_dirs if d not in existing]
+    if not remote_dirs:
+        return
+    # mkdir -p 会顺带建出所有上级目录，所以命令里只需列出叶子目录
+    parents = {posixpath.dirname(d) for d in remote_dirs}
+    leaves = [d for d in remote_dirs if d not in parents]
+    try:
+        _, stdout, _ = ssh.exec_command('mkdir -p ' + ' '.join(shlex.quote(d) for d in leaves))
+        if stdout.channel.recv_exit_status() == 0:
+            return
+    except Exception:
+        pass
+    sftp_mkdirs(sftp, remote_dirs)
+
+def sftp_mkdirs(sftp, remote_dirs):
+    # 用 paramiko 内部的异步请求接口流水线化 mkdir：同一层级的目录一次性全部发出再统一收应答，
+    # 往返次数从目录数降到目录树的层数；父目录所在的层级收完应答后才发下一层
+    from paramiko.sftp import CMD_MKDIR
+    from paramiko.sftp_attr import SFTPAttributes
+    levels = {}
+    for remote_path in remote_dirs:
+        levels.setdefault(remote_path.rstrip('/').count('/'), []).append(remote_path)
+    for depth in sorted(levels):
+        nums = []
+        for remote_path in levels[depth]:
+            attr = SFTPAttributes()
+            attr.st_mode = 0o777
+            nums.append(sftp._async_request(type(None), CMD_MKDIR, remote_path, attr))
+        # 应答逐个读掉；目录已存在等失败状态和原来逐个 mkdir 时一样忽略
+        while any(num in sftp._expecting for num in nums):
+            sftp._read_response()
+
+def calc_file_blake2b(path):
+    # 清单里只用来比对内容是否变化，16 字节的 blake2b 足够且比 sha256 快；
+    # file_digest 用 readinto 复用同一块缓冲区，不必再为大文件单独 mmap
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+        h = hashlib.blake2b(digest_size=16)
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+        return h.hexdigest()
+
+def read_remote_manifest(sftp, remote_dir):
+    # 上次部署留在远端目录里的 {相对路径: 内容哈希}，没有或损坏时当作空清单
+    try:
+        with sftp.open(posixpath.join(remote_dir, MANIFEST_NAME), 'rb') as f:
+            data = json_loads(f.read())
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+def replace_remote(sftp, src, dst):
+    try:
+        sftp.posix_rename(src, dst)
+    except IOError:
+        # 服务器不支持 posix-rename 扩展时退回先删再改名
+        try:
+            sftp.remove(dst)
         except IOError:
-            sftp.mkdir(remote_path)
-        for file in files:
-            local_file = os.path.join(root, file)
-            remote_file = os.path.join(remote_path, file).replace("\\", "/")
-            sftp.put(local_file, remote_file)
-            uploaded += 1
-            percent = int(uploaded * 100 / total_files)
-            print(f"\r上传进度: {percent}%", end="")
-    sftp.close()
-    print("\n上传完成。")
+            pass
+        sftp.rename(src, dst)
+
+def write_remote_manifest(sftp, remote_dir, manifest):
+    # 先写临时文件再改名，避免留下写了一半的清单
+    path = posixpath.join(remote_dir, MANIFEST_NAME)
+    tmp = path + '.tmp'
+    with sftp.open(tmp, 'wb') as f:
+        f.write(json_dumps(manifest, indent=False))
+    replace_remote(sftp, tmp, path)
+
+def part_path(remote_file, digest=None):
+    # .part 名字带上本地文件的内容哈希：只有内容完全相同的上次上传才会被续传
+    return f"{remote_file}.{digest}{PART_SUFFIX}" if digest else remote_file + PART_SUFFIX
+
+def skip_unchanged(sftp, all_files, remote_dirs, same_content=None, digests=None):
+    # 类似 rsync 的快速检查：每个远端目录 listdir_attr 一次，大小相同且远端不比本地旧的文件不再上传
+    # same_content 为远端清单里有记录的文件 {远端路径: 内容哈希是否相同}，有记录时以哈希为准
+    # digests 为本地文件的 {远端路径: 内容哈希}，用来找能续传的 .part
+    # 同时返回列举成功（即已存在）的远端目录，建目录时可以跳过，
+    # 上次中断留下、可以续传的 .part 文件 {远端路径: 已上传字节数}，
+    # 以及内容已经对不上、不会再用到的旧 .part 文件列表
+    same_content = same_content or {}
+    digests = digests or {}
+    remote_attrs = {}
+    existing = set()
+    for remote_path in remote_dirs:
+        try:
+            attrs = sftp.listdir_attr(remote_path)
+        except IOError:
+            # 远端目录还不存在，里面的文件都要上传
+            continue
+        existing.add(remote_path)
+        prefix = remote_path.rstrip('/') + '/'
+        for attr in attrs:
+            remote_attrs[prefix + attr.filename] = attr
+    changed = []
+    partial = {}
+    for item in all_files:
+        local_file, remote_file, size = item
+        attr = remote_attrs.get(remote_file)
+        if attr is None or attr.st_size != size:
+            changed.append(item)
+        elif remote_file in same_content:
+            if not same_content[remote_file]:
+                changed.append(item)
+        elif attr.st_mtime is None or int(attr.st_mtime) < int(os.stat(local_file).st_mtime):
+            changed.append(item)
+        else:
+            continue
+        # 哈希相同的 .part 就是这份内容上次传到一半的结果，可以从已写入的位置接着传
+        part = remote_attrs.get(part_path(remote_file, digests.get(remote_file)))
+        if part is not None and 0 < part.st_size < size:
+            partial[remote_file] = part.st_size
+    resumable = {part_path(remote_file, digests.get(remote_file)) for remote_file in partial}
+    stale = [path for path in remote_attrs if path.endswith(PART_SUFFIX) and path not in resumable]
+    return changed, existing, partial, stale
+
+def upload_one(sftp, local_file, remote_file, progress=None, resume_from=0, digest=None):
+    # 不经过 sftp.put 的中间缓冲，按 1MiB 读取本地文件直接写入流水线化的远端文件
+    # 先写到 .part 再改名：网站不会读到写了一半的文件，中断后下次还能从 .part 续传
+    part = part_path(remote_file, digest)
+    with open(local_file, 'rb', buffering=0) as src, \
+            sftp.open(part, 'ab' if resume_from else 'wb') as dst:
+        if resume_from:
+            src.seek(resume_from)
+            if progress:
+                progress(resume_from)
+        dst.set_pipelined(True)
+        dst.MAX_REQUEST_SIZE = SFTP_WRITE_REQUEST_SIZE
+        writer = _ProgressWriter(dst.write, progress) if progress else dst
+        shutil.copyfileobj(src, writer, length=UPLOAD_CHUNK_SIZE)
+    replace_remote(sftp, part, remote_file)
+
+def asyncssh_upload(config, files, progress, file_done, workers=SFTP_WORKERS, digests=None):
+    # asyncssh 的加解密和收发在 C 扩展/事件循环里完成，单连接吞吐高于 paramiko；
+    # 一条 SFTP 会话上同时跑 workers 个 put，每个 put 内部再保持 64 个写请求在途
+    import asyncio
+    import asyncssh
+
+    async def run():
+        async with asyncssh.connect(config['host'], port=int(config['port']),
+                                    username=config['username'], password=config.get('password') or None,
+                                    known_hosts=None,
+                                    client_keys=[os.path.expanduser(config['key_path'])] if config.get('key_path') else None,
+                                    passphrase=config.get('key_passphrase') or None,
+                                    agent_path=() if config.get('use_agent') else None) as conn:
+            async with conn.start_sftp_client() as sftp:
+                limit = asyncio.Semaphore(workers)
+
+                async def put(item):
+                    local_file, remote_file, _ = item
+                    sent = 0
+
+                    def handler(src, dst, copied, total):
+                        nonlocal sent
+                        progress(copied - sent)
+                        sent = copied
+
+                    # 和 upload_one 一样先写 .part 再改名，网站不会读到写了一半的文件
+                    part = part_path(remote_file, (digests or {}).get(remote_file))
+                    async with limit:
+                        await sftp.put(local_file, part, max_requests=64,
+                                       progress_handler=handler)
+                        try:
+                            await sftp.posix_rename(part, remote_file)
+                        except asyncssh.SFTPError:
+                            # 服务器不支持 posix-rename 扩展时退回先删再改名
+                            try:
+                                await sftp.remove(remote_file)
+                            except asyncssh.SFTPError:
+                                pass
+                            await sftp.rename(part, remote_file)
+                    file_done()
+
+                await asyncio.gather(*(put(item) for item in files))
+
+    asyncio.run(run())
+
+def sftp_upload(local_dir, remote_dir, ssh, workers=SFTP_WORKERS, force=False, asyncssh_config=None):
+    from concurrent.futures import ThreadPoolExecutor
+    from tqdm import tqdm
+    print(f"开始上传 {local_dir} 到 {remote_dir} ...")
+    # 打开的 SFTP 通道都登记在 clients 里，任何一步出错都在 finally 里关掉
+    clients = []
+    bar = None
+    try:
+        sftp = open_sftp(ssh)
+        clients.append(sftp)
+        # 先串行建好目录并收集文件列表，再并发上传
+        all_files, remote_dirs = collect_files(local_dir, remote_dir)
+        # 本地内容哈希清单：重新打包后 mtime 全变了，内容没变的文件靠哈希对比也能跳过
+        root = remote_dir.rstrip('/') + '/'
+        # hashlib 在计算大块数据时会释放 GIL，多线程同时哈希，整个阶段基本只受磁盘速度限制
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+            digests = dict(zip([remote_file for _, remote_file, _ in all_files],
+                               pool.map(calc_file_blake2b, [local_file for local_file, _, _ in all_files])))
+        manifest = {remote_file[len(root):]: digest for remote_file, digest in digests.items()}
+        old_manifest = {}
+        existing = set()
+        partial = {}
+        if not force:
+            old_manifest = read_remote_manifest(sftp, remote_dir)
+            same_content = {root + rel: old_manifest[rel] == digest
+                            for rel, digest in manifest.items() if rel in old_manifest}
+            changed, existing, partial, stale = skip_unchanged(sftp, all_files, remote_dirs,
+                                                              same_content, digests)
+            if len(changed) < len(all_files):
+                print(f"跳过 {len(all_files) - len(changed)} 个未变化的文件。")
+            # 本地内容已经变了的中断残留不会再续传，顺手删掉
+            for path in stale:
+                try:
+                    sftp.remove(path)
+                except IOError:
+                    pass
+            all_files = changed
+        make_remote_dirs(ssh, sftp, remote_dirs, existing)
+        if not all_files:
+            if manifest != old_manifest:
+                write_remote_manifest(sftp, remote_dir, manifest)
+            print("没有需要上传的文件。")
+            return
+        if old_manifest:
+            # 上传中途失败时远端文件和旧清单对不上，先删掉旧清单，下次退回按大小/mtime 判断
+            try:
+                sftp.remove(posixpath.join(remote_dir, MANIFEST_NAME))
+            except IOError:
+                pass
+        if remote_has_tar(ssh):
+            # 小文件的开销主要在逐个打开/关闭的往返上，合并成一个 tar 流；大文件仍走并发 SFTP
+            small = [item for item in all_files if item[2] < SMALL_FILE_SIZE]
+            large = [item for item in all_files if item[2] >= SMALL_FILE_SIZE]
+        else:
+            print("远端不支持 tar，全部逐文件 SFTP 上传。")
+            small, large = [], list(all_files)
+        # 大文件先发：并发上传时最后剩下的都是小文件，各通道能几乎同时结束
+        large.sort(key=lambda item: item[2], reverse=True)
+        if asyncssh_config is not None:
+            try:
+                import asyncssh
+            except ImportError:
+                print("未安装 asyncssh，改用 paramiko 上传。")
+                asyncssh_config = None
+        # 文件大小在 collect_files 的单次遍历里已经拿到，进度条总量无需再单独扫描目录
+        total_bytes = sum(size for _, _, size in all_files)
+        # paramiko 的 SFTPClient 不是线程安全的，每个线程从队列里取一个独占的通道
+        # 每个通道打开要经过 channel open、subsystem、版本协商几次往返，几个通道同时打开
+        extra = 0 if asyncssh_config is not None else min(workers, len(large), SSH_MAX_SESSIONS - 2) - 1
+        if extra > 0:
+            def try_open_sftp(_):
+                try:
+                    return open_sftp(ssh)
+                except Exception:
+                    return None
+            with ThreadPoolExecutor(max_workers=extra) as pool:
+                opened = list(pool.map(try_open_sftp, range(extra)))
+            # 服务器的 MaxSessions 等限制可能让部分通道打不开，用已经打开的通道继续上传
+            clients.extend(client for client in opened if client is not None)
+        idle = queue.Queue()
+        for client in clients:
+            idle.put(client)
+        lock = threading.Lock()
+        total_files = len(all_files)
+        done_files = 0
+        # 一个进度条：按字节推进，后缀显示已完成的文件数
+        bar = tqdm(total=total_bytes, unit='B', unit_scale=True, desc='上传')
+
+        def progress(n):
+            with lock:
+                bar.update(n)
+
+        def file_done():
+            nonlocal done_files
+            with lock:
+                done_files += 1
+                bar.set_postfix_str(f'{done_files}/{total_files} 个文件', refresh=False)
+
+        def worker(item):
+            local_file, remote_file, _ = item
+            client = idle.get()
+            try:
+                upload_one(client, local_file, remote_file, progress, partial.get(remote_file, 0),
+                           digests[remote_file])
+            finally:
+                idle.put(client)
+            file_done()
+
+        # tar 流占一个额外线程，与大文件的 SFTP 上传同时进行
+        with ThreadPoolExecutor(max_workers=len(clients) + 1) as pool:
+            futures = []
+            if small:
+                futures.append(pool.submit(tar_upload, small, remote_dir, ssh, progress, file_done,
+                                           tar_use_zstd(ssh)))
+            if asyncssh_config is not None:
+                # 大文件交给 asyncssh 单独一个连接并发上传
+                if large:
+                    futures.append(pool.submit(asyncssh_upload, asyncssh_config, large,
+                                               progress, file_done, workers, digests))
+            else:
+                futures.extend(pool.submit(worker, item) for item in large)
+            for future in futures:
+                future.result()
+        write_remote_manifest(sftp, remote_dir, manifest)
+    finally:
+        if bar is not None:
+            bar.close()
+        for client in clients:
+            client.close()
+    print("上传完成。")
+
+def is_local_copy(config):
+    # 只有显式打开 local_copy 才绕过 SSH：127.0.0.1 也可能是转发到别处的端口或容器
+    return bool(config.get('local_copy')) and config['host'] in LOCAL_HOSTS
+
+def local_copy_dist(local_dir, remote_dir):
+    # copytree 逐文件用 copy2，Linux 上由内核 sendfile 完成拷贝
+    print(f"本机部署：复制 {local_dir} 到 {remote_dir} ...")
+    shutil.copytree(local_dir, remote_dir, dirs_exist_ok=True)
+    print("复制完成。")
+
+def finish_deploy(config):
+    import webbrowser
+    # 默认保留本地 dist，下次部署可以跳过未变化的文件；keep_dist 设为 false 才删除
+    if config.get('keep_dist') is False:
+        print("删除本地 dist 目录...")
+        remove_local_dist(config['local_dist'])
+        print("dist 目录已删除。")
+    else:
+        print("保留本地 dist 目录。")
+    print("打开浏览器测试页面...")
+    webbrowser.open(config['test_url'])
+    save_history_record(config)
+
+def _remove_readonly(func, path, exc_info):
+    # Windows 上只读文件删不掉，去掉只读属性后重试一次
+    import stat
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+def remove_local_dist(path):
+    # POSIX 下直接交给 rm -rf，省去 Python 逐个 unlink/rmdir 的开销；Windows 仍用 shutil.rmtree
+    if os.name != 'nt' and shutil.which('rm'):
+        import subprocess
+        subprocess.run(['rm', '-rf', '--', path], check=True)
+    else:
+        shutil.rmtree(path, onerror=_remove_readonly)
 
 def menu_copy_config():
     print("\n==== 复制配置到本地工具菜单 ====")
     print("请粘贴一份单条配置（格式如 {\"name\":\"xx\",...}），按回车结束：")
     user_input = input().strip()
     try:
-        cfg = json.loads(user_input)
+        cfg = json_loads(user_input)
         if not isinstance(cfg, dict):
             raise ValueError
         # 检查必须包含 name、host、username、remote_path 字段（可根据实际需求调整）
@@ -202,27 +926,29 @@ def menu_copy_config():
     except Exception as e:
         print("❌ 粘贴内容不是有效的 JSON 对象，或格式错误！\n")
 
+def _new_history_path():
+    return os.path.join(HISTORY_DIR, datetime.now().strftime('%Y-%m-%d_%H%M%S_%f') + '.json')
+
 def save_history_record(record):
-    date_str = datetime.now().strftime('%Y-%m-%d')
-    base_path = os.path.join(HISTORY_DIR, f'{date_str}.json')
-    if not os.path.exists(base_path):
-        path = base_path
-    else:
-        # 查找已有同日文件，自动编号
-        i = 1
-        while True:
-            suffix = f'({i:03d}a)'
-            path = os.path.join(HISTORY_DIR, f'{date_str}{suffix}.json')
-            if not os.path.exists(path):
-                break
-            i += 1
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(record, f, ensure_ascii=False, indent=2)
+    # 文件名精确到微秒，用 'x' 模式打开即可保证不重名，无需逐个探测编号
+    path = _new_history_path()
+    try:
+        f = open(path, 'xb')
+    except FileExistsError:
+        path = _new_history_path()
+        f = open(path, 'xb')
+    with f:
+        f.write(json_dumps(record))
     print(f'历史记录已保存: {path}')
 
-def list_history_records():
-    files = glob.glob(os.path.join(HISTORY_DIR, '*.json'))
-    files.sort()
+def list_history_records(limit=HISTORY_LIST_LIMIT):
+    # 只取文件名最大（最新）的 limit 条，按时间先后列出
+    with os.scandir(HISTORY_DIR) as it:
+        names = [e.name for e in it if e.name.endswith('.json') and e.is_file()]
+    if limit:
+        names = heapq.nlargest(limit, names)
+    names.sort()
+    files = [os.path.join(HISTORY_DIR, name) for name in names]
     if not files:
         print('无历史记录')
     else:
@@ -234,19 +960,14 @@ def delete_history_record():
     files = list_history_records()
     if not files:
         return
-    idx = input('输入要删除的历史记录序号: ').strip()
-    try:
-        idx = int(idx) - 1
-        if 0 <= idx < len(files):
-            os.remove(files[idx])
-            print('已删除:', os.path.basename(files[idx]))
-        else:
-            print('无效序号!')
-    except Exception:
-        print('输入有误!')
+    idx = parse_index(input('输入要删除的历史记录序号: '), len(files))
+    if idx is None:
+        print('无效序号!')
+        return
+    os.remove(files[idx])
+    print('已删除:', os.path.basename(files[idx]))
 
-def export_configs():
-    configs = load_configs()
+def export_configs(configs):
     if not configs:
         print('无配置可导出。')
         return
@@ -260,23 +981,36 @@ def export_configs():
         if not selected:
             print('未选择任何有效配置。')
             return
-        out = json.dumps(selected, ensure_ascii=False, indent=2)
+        out = json_dumps(selected).decode('utf-8')
         print('\n===== 导出内容如下（可复制保存） =====\n')
         print(out)
         print('\n===== 复制结束 =====\n')
     except Exception as e:
         print('输入有误，导出失败！')
 
-def log_menu_usage(menu_name):
+def migrate_menu_history():
+    # 旧文件可能是 JSON 数组，也可能已是逐行格式；统一转成 JSON Lines 放到新文件开头
+    if not os.path.exists(LEGACY_MENU_HISTORY_FILE):
+        return
     try:
+        with open(LEGACY_MENU_HISTORY_FILE, 'rb') as f:
+            data = f.read()
+        if data.lstrip().startswith(b'['):
+            data = b''.join(json_dumps(item, indent=False) + b'\n' for item in json_loads(data))
         if os.path.exists(MENU_HISTORY_FILE):
-            with open(MENU_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-        else:
-            history = []
-        history.append({'menu': menu_name, 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
-        with open(MENU_HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
+            with open(MENU_HISTORY_FILE, 'rb') as f:
+                data += f.read()
+        write_file_atomic(MENU_HISTORY_FILE, data)
+        os.remove(LEGACY_MENU_HISTORY_FILE)
+    except Exception as e:
+        pass
+
+def log_menu_usage(menu_name):
+    # 追加写一行，不再读回整个历史文件
+    try:
+        record = {'menu': menu_name, 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        with open(MENU_HISTORY_FILE, 'ab') as f:
+            f.write(json_dumps(record, indent=False) + b'\n')
     except Exception as e:
         pass
 
@@ -284,25 +1018,43 @@ def show_menu_history():
     if not os.path.exists(MENU_HISTORY_FILE):
         print('暂无菜单使用历史。')
         return
-    with open(MENU_HISTORY_FILE, 'r', encoding='utf-8') as f:
-        history = json.load(f)
+    # 只保留文件末尾 20 行，不解析整个历史
+    with open(MENU_HISTORY_FILE, 'rb') as f:
+        lines = deque(f, maxlen=20)
+    history = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            history.append(json_loads(line))
+        except ValueError:
+            continue
     if not history:
         print('暂无菜单使用历史。')
         return
     print('\n==== 菜单使用历史（最近20条） ====' )
-    for i, item in enumerate(history[-20:]):
+    for i, item in enumerate(history):
         print(f'{i+1}. {item["timestamp"]} - {item["menu"]}')
     print('==============================\n')
 
+# 本机 IP 只探测一次，之后每次画菜单直接复用
+_LOCAL_IP = None
+
 def get_local_ip():
+    global _LOCAL_IP
+    if _LOCAL_IP is not None:
+        return _LOCAL_IP
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.settimeout(0.5)
         s.connect(('8.8.8.8', 80))
         ip = s.getsockname()[0]
         s.close()
-        return ip
     except Exception:
-        return '未知IP'
+        ip = '未知IP'
+    _LOCAL_IP = ip
+    return ip
 
 def get_os_info():
     return f"{platform.system()} {platform.release()}"
@@ -326,79 +1078,191 @@ def get_greeting(now):
 def get_python_version():
     return f"Python {sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
 
-def get_remote_version():
+# 远端版本号缓存，菜单刷新时不再每次同步请求 GitHub
+# 远端版本号和脚本是否需要升级都在后台线程里检查，菜单重绘只读缓存结果
+REMOTE_CHECK_INTERVAL = 3600
+_REMOTE_CHECKS = {'version': None, 'need_upgrade': False}
+_REMOTE_CHECKS_LOCK = threading.Lock()
+
+def _refresh_remote_checks():
+    version, remote_hash = fetch_remote_script()
+    need_upgrade = check_need_upgrade(remote_hash)
+    with _REMOTE_CHECKS_LOCK:
+        _REMOTE_CHECKS['version'] = version
+        _REMOTE_CHECKS['need_upgrade'] = need_upgrade
+    # 每隔一段时间再查一次，而不是每次按键都请求 GitHub
+    timer = threading.Timer(REMOTE_CHECK_INTERVAL, _refresh_remote_checks)
+    timer.daemon = True
+    timer.start()
+
+def start_remote_checks():
+    threading.Thread(target=_refresh_remote_checks, daemon=True).start()
+
+def get_remote_checks():
+    with _REMOTE_CHECKS_LOCK:
+        return _REMOTE_CHECKS['version'], _REMOTE_CHECKS['need_upgrade']
+
+def _load_remote_version_cache():
+    try:
+        with open(REMOTE_VERSION_CACHE_FILE, 'rb') as f:
+            return json_loads(f.read())
+    except Exception:
+        return {}
+
+def _parse_remote_version(f):
+    for line in f:
+        line = line.decode('utf-8').strip()
+        if line.startswith("__version__"):
+            # 兼容远端 __version__ 可能是字符串或表达式
+            val = line.split('=')[1].strip()
+            if val.startswith('datetime.') or 'strftime' in val:
+                # 远端是表达式，直接返回空，避免误报
+                return None
+            return val.strip('"').strip("'")
+    return None
+
+def fetch_remote_script():
+    # 一次请求同时拿到远端版本号和脚本的 sha256，返回 (version, sha256)，失败时为 (None, None)
+    import urllib.request
+    import urllib.error
     url = REMOTE_SCRIPT_URL
+    # 带上次的 ETag/Last-Modified 做条件请求，远端没变时只收到 304 响应头，
+    # 版本号和哈希都用缓存里的；旧缓存里没有 sha256 时照常完整下载一次
+    cache = _load_remote_version_cache()
+    headers = {}
+    if cache.get('sha256'):
+        if cache.get('etag'):
+            headers['If-None-Match'] = cache['etag']
+        if cache.get('last_modified'):
+            headers['If-Modified-Since'] = cache['last_modified']
     try:
-        with urllib.request.urlopen(url, timeout=3) as f:
-            for line in f:
-                line = line.decode('utf-8').strip()
-                if line.startswith("__version__"):
-                    # 兼容远端 __version__ 可能是字符串或表达式
-                    val = line.split('=')[1].strip()
-                    if val.startswith('datetime.') or 'strftime' in val:
-                        # 远端是表达式，直接返回空，避免误报
-                        return None
-                    return val.strip('"').strip("'")
-        return None
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=3) as f:
+            data = f.read()
+            etag, last_modified = f.headers.get('ETag'), f.headers.get('Last-Modified')
+        version = _parse_remote_version(data.splitlines())
+        sha256 = hashlib.sha256(data).hexdigest()
+        if etag or last_modified:
+            record = {'etag': etag, 'last_modified': last_modified,
+                      'version': version, 'sha256': sha256}
+            try:
+                write_file_atomic(REMOTE_VERSION_CACHE_FILE, json_dumps(record))
+            except OSError:
+                pass
+        return version, sha256
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return cache.get('version'), cache.get('sha256')
+        return None, None
     except Exception:
-        return None
+        return None, None
 
 def calc_file_sha256(path):
+    # 分块喂给 hasher，内存占用只与块大小有关；3.11+ 直接用 hashlib.file_digest
     try:
         with open(path, 'rb') as f:
-            return hashlib.sha256(f.read()).hexdigest()
+            if hasattr(hashlib, 'file_digest'):
+                return hashlib.file_digest(f, 'sha256').hexdigest()
+            h = hashlib.sha256()
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+            return h.hexdigest()
     except Exception:
         return None
 
-def calc_url_sha256(url):
+def remember_local_sha256(path, sha256):
+    # 记下脚本的哈希以及对应的大小/mtime，文件没变时下次启动不必重新读取计算
     try:
-        with urllib.request.urlopen(url, timeout=5) as resp:
-            return hashlib.sha256(resp.read()).hexdigest()
+        st = os.stat(path)
+        record = {'path': os.path.abspath(path), 'size': st.st_size,
+                  'mtime_ns': st.st_mtime_ns, 'sha256': sha256}
+        write_file_atomic(LAST_HASH_FILE, json_dumps(record))
     except Exception:
-        return None
+        pass
+
+def cached_file_sha256(path):
+    try:
+        st = os.stat(path)
+        with open(LAST_HASH_FILE, 'rb') as f:
+            record = json_loads(f.read())
+        if (record.get('path') == os.path.abspath(path) and record.get('size') == st.st_size
+                and record.get('mtime_ns') == st.st_mtime_ns):
+            return record['sha256']
+    except Exception:
+        pass
+    sha256 = calc_file_sha256(path)
+    if sha256:
+        remember_local_sha256(path, sha256)
+    return sha256
+
+def check_need_upgrade(remote_hash):
+    # remote_hash 来自 fetch_remote_script，不再为比对哈希单独下载一遍脚本
+    local_hash = cached_file_sha256(sys.argv[0])
+    return bool(remote_hash and local_hash and local_hash != remote_hash)
+
+def copy_overlapped(src, dst, progress, length=DOWNLOAD_CHUNK_SIZE, hasher=None):
+    # 后台线程从网络读取，当前线程写盘，二者经有界队列交接，网络等待和磁盘写入可以重叠
+    chunks = queue.Queue(maxsize=4)
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        try:
+            while not stop.is_set():
+                data = src.read(length)
+                if not data:
+                    break
+                chunks.put(data)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            chunks.put(None)
 
-def check_need_upgrade():
-    local_hash = calc_file_sha256(sys.argv[0])
-    remote_hash = calc_url_sha256(REMOTE_SCRIPT_URL)
-    if remote_hash and local_hash and local_hash != remote_hash:
-        print("⚠️ 检测到脚本内容有更新或本地被修改，建议使用菜单12升级！")
+    t = threading.Thread(target=reader, daemon=True)
+    t.start()
+    try:
+        while True:
+            data = chunks.get()
+            if data is None:
+                break
+            if hasher:
+                hasher.update(data)
+            dst.write(data)
+            progress(len(data))
+    except Exception:
+        # 写盘失败时通知读线程停下，并取空队列让它能退出
+        stop.set()
+        while chunks.get() is not None:
+            pass
+        raise
+    finally:
+        t.join()
+    if errors:
+        raise errors[0]
 
 def self_update():
+    import subprocess
+    import tempfile
+    import urllib.request
+    from tqdm import tqdm
     target = sys.argv[0]
     url = REMOTE_SCRIPT_URL
     print("正在下载最新版...")
 
     try:
-        use_tqdm = True
-
+        # 下载的同时计算哈希，升级后下次启动检查更新时无需再读一遍本地脚本
+        h = hashlib.sha256()
         with urllib.request.urlopen(url) as response:
             total = int(response.getheader('Content-Length', 0))
-            downloaded = 0
-            chunk_size = 8192
             with tempfile.NamedTemporaryFile('wb', delete=False) as tmp_file:
                 tmp_path = tmp_file.name
-                if use_tqdm:
-                    bar = tqdm(total=total, unit='B', unit_scale=True, desc='下载进度')
-                start = time.time()
-                while True:
-                    chunk = response.read(chunk_size)
-                    if not chunk:
-                        break
-                    tmp_file.write(chunk)
-                    downloaded += len(chunk)
-                    if use_tqdm:
-                        bar.update(len(chunk))
-                    else:
-                        percent = downloaded * 100 // total if total else 0
-                        speed = downloaded / (time.time() - start + 0.1)
-                        print(f"\r进度: {percent}%  {downloaded//1024}KB/{total//1024}KB  速度: {speed/1024:.2f}KB/s", end='', flush=True)
-                if use_tqdm:
-                    bar.close()
+                with tqdm(total=total or None, unit='B', unit_scale=True, desc='下载进度') as bar:
+                    copy_overlapped(response, tmp_file, bar.update, hasher=h)
         print("\n下载完成，准备覆盖本地脚本...")
 
         try:
             shutil.move(tmp_path, target)
             os.chmod(target, 0o755)  # 自动恢复可执行权限
+            remember_local_sha256(target, h.hexdigest())
             print("升级成功，请重新运行命令。")
             sys.exit(0)
         except PermissionError as e:
@@ -412,6 +1276,7 @@ def self_update():
                         f"import shutil,os;shutil.move('{tmp_path}','{target}');os.chmod('{target}',0o755)"
                     ]
                     subprocess.check_call(cmd)
+                    remember_local_sha256(target, h.hexdigest())
                     print("升级成功（sudo），请重新运行命令。")
                     sys.exit(0)
                 except Exception as e2:
@@ -424,8 +1289,275 @@ def self_update():
     except Exception as e:
         print(f"升级失败，请检查网络或权限。错误: {e}")
 
+# ===== 主菜单文本，只在模块加载时拼好一次 =====
+MENU_HEADER = "\n==== 自动化部署工具菜单 ===="
+MENU_BODY = "\n".join([
+    "请选择下面的菜单：",
+    "1. 新增必要配置",
+    "2. 查看所有配置",
+    "3. 修改指定配置",
+    "4. 删除配置",
+    "5. 添加配置（复制粘贴）",
+    "6. 部署/上传",
+    "7. 查看历史记录",
+    "8. 删除历史记录",
+    "9. 导出配置",
+    "10. 查看菜单使用历史",
+    "11. 退出",
+    "12. 升级到最新版",
+    "13. 测试 SSH 连接",
+    "14. 批量导入配置",
+]) + "\n"
+# 需要记录到菜单使用历史的选项
+MENU_MAP = {
+    '1': '新增必要配置', '2': '查看所有配置', '3': '修改指定配置',
+    '4': '删除配置', '5': '添加配置（复制粘贴）', '6': '部署/上传',
+    '7': '查看历史记录', '8': '删除历史记录', '9': '导出配置',
+}
+
+def parse_index(text, count):
+    # 把用户输入的 1 起始序号转成下标；先用 isdigit 校验，不靠捕获 int() 的异常
+    text = text.strip()
+    if not text.isdigit():
+        return None
+    idx = int(text) - 1
+    return idx if 0 <= idx < count else None
+
+def menu_add_config(store):
+    config = input_config()
+    store.items.append(config)
+    store.save()
+    print("配置已新增。")
+
+def menu_list_configs(store):
+    if not store.items:
+        print("无配置。")
+    for i, c in enumerate(store.items):
+        print(f"{i+1}. {c}")
+
+def menu_edit_config(store):
+    if not store.items:
+        print("无配置。")
+        return
+    idx = parse_index(input("输入要修改的配置序号: "), len(store.items))
+    if idx is None:
+        print("无效序号！")
+        return
+    configs = store.items
+    print("原配置:", configs[idx])
+    # 传递原配置给 input_config，只有用户输入才覆盖，否则用原值
+    configs[idx] = input_config(default=configs[idx])
+    store.save()
+    print("配置已修改。")
+
+def menu_delete_config(store):
+    if not store.items:
+        print("无配置。")
+        return
+    idx = parse_index(input("输入要删除的配置序号: "), len(store.items))
+    if idx is None:
+        print("无效序号！")
+        return
+    store.items.pop(idx)
+    store.save()
+    print("配置已删除。")
+
+def menu_deploy(store):
+    configs = store.items
+    config_idx, config = select_config(configs)
+    if not config:
+        return
+    if not check_dist(config['local_dist']):
+        return
+    if is_local_copy(config):
+        # 目标就在本机：不走 SSH 加解密，直接本地复制
+        try:
+            local_copy_dist(config['local_dist'], config['remote_path'])
+            finish_deploy(config)
+        except Exception as e:
+            print(f"部署失败: {str(e)}")
+        return
+    def try_ssh_connect(config, result_holder):
+        try:
+            print(f"[DEBUG] 尝试连接 {config['host']}:{config['port']} 用户:{config['username']}")
+            result_holder['ssh'] = get_ssh(config)
+            result_holder['ok'] = True
+        except Exception as e:
+            result_holder['error'] = str(e)
+    max_retries = 2
+    for retry_count in range(max_retries):
+        result_holder = {'ok': False, 'error': None, 'ssh': None}
+        t = threading.Thread(target=try_ssh_connect, args=(config, result_holder))
+        t.start()
+        t.join(20)
+        if t.is_alive():
+            print(f"[ERROR] 连接服务器超时（20秒未响应），自动中断。")
+            t.join(0.1)
+            result_holder['error'] = 'Timeout'
+        if result_holder['ok']:
+            ssh = result_holder['ssh']
+            print("连接成功！")
+            break
+        else:
+            print(f"[ERROR] 连接失败: {result_holder['error']}")
+            print("请选择操作：1. 重新输入配置  2. 修改配置  3. 删除该配置  4. 跳过")
+            op = input("输入序号: ").strip()
+            if op == '1':
+                # 重新输入所有配置项
+                for key in ['host', 'port', 'username', 'password']:
+                    val = input(f"请输入 {key}（原值: {config.get(key)}）: ").strip()
+                    if val:
+                        if key == 'port':
+                            config[key] = int(val)
+                        else:
+                            config[key] = val
+                if config_idx is not None:
+                    configs[config_idx] = config
+                    store.save()
+                print("已更新配置，重新尝试连接...")
+                continue
+            elif op == '2':
+                # 进入完整配置编辑模式
+                for key in config:
+                    val = input(f"请输入 {key}（原值: {config.get(key)}，回车跳过）: ").strip()
+                    if val:
+                        if key == 'port':
+                            config[key] = int(val)
+                        else:
+                            config[key] = val
+                if config_idx is not None:
+                    configs[config_idx] = config
+                    store.save()
+                print("已修改配置，重新尝试连接...")
+                continue
+            elif op == '3':
+                # 删除该配置
+                if config_idx is not None:
+                    configs.pop(config_idx)
+                    store.save()
+                    print("已删除该配置。")
+                return
+            elif op == '4':
+                print("跳过该配置。"); return
+            else:
+                print("无效输入，跳过该配置。"); return
+    else:
+        print("多次尝试后仍无法连接服务器。")
+        return
+    try:
+        sftp_upload(config['local_dist'], config['remote_path'], ssh,
+                    workers=int(config.get('sftp_workers') or SFTP_WORKERS),
+                    force=bool(config.get('force_upload')),
+                    asyncssh_config=config if config.get('backend') == 'asyncssh' else None)
+        finish_deploy(config)
+    except Exception as e:
+        print(f"部署失败: {str(e)}")
+
+def menu_test_ssh(store):
+    configs = store.items
+    if not configs:
+        print("无配置。")
+        return
+    _, config = select_config(configs)
+    if not config:
+        return
+    print(f"[连接测试] 尝试连接 {config['host']}:{config['port']} 用户:{config['username']}")
+    try:
+        get_ssh(config)
+        print("[连接测试] SSH 连接成功！")
+    except Exception as e:
+        print(f"[连接测试] SSH 连接失败: {e}")
+        import traceback
+        traceback.print_exc()
+
+def menu_import_configs(store):
+    print("请粘贴要导入的配置（支持 JSON 数组或单个对象）：")
+    try:
+        configs_to_import = read_pasted_json()
+        if isinstance(configs_to_import, dict):
+            configs_to_import = [configs_to_import]
+    except Exception as e:
+        print(f"导入内容格式错误: {e}，已返回菜单。")
+        return
+    candidates = []
+    for idx, cfg in enumerate(configs_to_import):
+        missing = missing_config_fields(cfg)
+        if missing:
+            print(f"第{idx+1}条配置缺少字段: {missing}，跳过")
+            continue
+        # 端口先转成整数，ssh_pool_key 去重时不会因为 "abc" 之类的值抛出异常中断菜单
+        try:
+            cfg['port'] = int(cfg['port'])
+        except (TypeError, ValueError) as e:
+            print(f"第{idx+1}条配置连接失败: {e}，跳过")
+            continue
+        candidates.append((idx, cfg))
+
+    def probe(cfg):
+        try:
+            get_ssh(cfg, timeout=10, banner_timeout=5)
+            return None
+        except Exception as e:
+            return e
+
+    # SSH 连接校验并行进行，总耗时取决于最慢的一条而不是所有超时之和；相同主机账号只连一次
+    valid_configs = []
+    if candidates:
+        from concurrent.futures import ThreadPoolExecutor
+        probes = {}
+        for _, cfg in candidates:
+            probes.setdefault(ssh_pool_key(cfg), cfg)
+        with ThreadPoolExecutor(max_workers=min(16, len(probes))) as pool:
+            results = dict(zip(probes, pool.map(probe, probes.values())))
+        for idx, cfg in candidates:
+            err = results[ssh_pool_key(cfg)]
+            if err is None:
+                print(f"第{idx+1}条配置连接验证通过！")
+                valid_configs.append(cfg)
+            else:
+                print(f"第{idx+1}条配置连接失败: {err}，跳过")
+    if valid_configs:
+        store.items.extend(valid_configs)
+        store.save()
+        print(f"成功导入 {len(valid_configs)} 条配置！")
+    else:
+        print("没有任何配置通过校验，导入失败！")
+
+# 菜单选项到处理函数的分派表，处理函数都接收 ConfigStore
+MENU_HANDLERS = {
+    '1': menu_add_config,
+    '2': menu_list_configs,
+    '3': menu_edit_config,
+    '4': menu_delete_config,
+    '5': menu_add_config,
+    '6': menu_deploy,
+    '7': lambda store: list_history_records(),
+    '8': lambda store: delete_history_record(),
+    '9': lambda store: export_configs(store.items),
+    '10': lambda store: show_menu_history(),
+    '12': lambda store: self_update(),
+    '13': menu_test_ssh,
+    '14': menu_import_configs,
+}
+
 def main_menu():
+    migrate_menu_history()
+    # 启动时就在后台检查远端版本和脚本哈希，第一次画菜单时不必等待网络
+    start_remote_checks()
+    store = ConfigStore()
+    # 退出菜单、Ctrl-C 或升级后 sys.exit 时统一把修改写回配置文件
+    atexit.register(store.flush)
+    # 关闭终端（SIGHUP）或被 kill（SIGTERM）默认不会走 atexit：先把修改写盘，
+    # 再按默认行为重新发出信号立即退出，不用 sys.exit，免得等线程池里排队的上传全部跑完
+    def flush_and_die(signum, frame):
+        store.flush()
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+    for signame in ('SIGHUP', 'SIGTERM'):
+        if hasattr(signal, signame):
+            signal.signal(getattr(signal, signame), flush_and_die)
     while True:
+        store.refresh()
         now_dt = datetime.now()
         now = now_dt.strftime('%Y-%m-%d %H:%M:%S')
         greeting = get_greeting(now_dt)
@@ -433,8 +1565,8 @@ def main_menu():
         os_info = get_os_info()
         py_ver = get_python_version()
         local_version = __version__
-        remote_version = get_remote_version()
-        print(f"\n==== 自动化部署工具菜单 ====")
+        remote_version, need_upgrade = get_remote_checks()
+        print(MENU_HEADER)
         print(f"当前时间: {now}  {greeting}")
         print(f"本机IP: {ip}")
         print(f"操作系统: {os_info}")
@@ -442,264 +1574,19 @@ def main_menu():
         print(f"当前脚本版本: {local_version}")
         if remote_version and remote_version != local_version:
             print(f"检测到新版本 {remote_version}，请使用菜单12升级！")
-        check_need_upgrade()
-        print("请选择下面的菜单：")
-        print("1. 新增必要配置")
-        print("2. 查看所有配置")
-        print("3. 修改指定配置")
-        print("4. 删除配置")
-        print("5. 添加配置（复制粘贴）")
-        print("6. 部署/上传")
-        print("7. 查看历史记录")
-        print("8. 删除历史记录")
-        print("9. 导出配置")
-        print("10. 查看菜单使用历史")
-        print("11. 退出")
-        print("12. 升级到最新版")
-        print("13. 测试 SSH 连接")
-        print("14. 批量导入配置")
-        choice = input("请选择操作: ")
-        if choice == '12':
-            self_update()
-        if choice == '10':
-            show_menu_history()
-            continue
-        menu_map = {
-            '1': '新增必要配置', '2': '查看所有配置', '3': '修改指定配置',
-            '4': '删除配置', '5': '添加配置（复制粘贴）', '6': '部署/上传',
-            '7': '查看历史记录', '8': '删除历史记录', '9': '导出配置',
-        }
-        if choice in menu_map:
-            log_menu_usage(menu_map[choice])
-        if choice == '1' or choice == '5':
-            config = input_config()
-            configs = load_configs()
-            configs.append(config)
-            save_configs(configs)
-            print("配置已新增。")
-        elif choice == '2':
-            if not load_configs():
-                print("无配置。")
-            for i, c in enumerate(load_configs()):
-                print(f"{i+1}. {c}")
-        elif choice == '3':
-            if not load_configs():
-                print("无配置。")
-                continue
-            idx = input("输入要修改的配置序号: ")
-            try:
-                idx = int(idx) - 1
-                configs = load_configs()
-                if 0 <= idx < len(configs):
-                    print("原配置:", configs[idx])
-                    # 传递原配置给 input_config，只有用户输入才覆盖，否则用原值
-                    config = input_config(default=configs[idx])
-                    configs[idx] = config
-                    save_configs(configs)
-                    print("配置已修改。")
-                else:
-                    print("无效序号！")
-            except Exception:
-                print("输入有误！")
-        elif choice == '4':
-            if not load_configs():
-                print("无配置。")
-                continue
-            idx = input("输入要删除的配置序号: ")
-            try:
-                idx = int(idx) - 1
-                if 0 <= idx < len(load_configs()):
-                    configs = load_configs()
-                    configs.pop(idx)
-                    save_configs(configs)
-                    print("配置已删除。")
-                else:
-                    print("无效序号！")
-            except Exception:
-                print("输入有误！")
-        elif choice == '5':
-            menu_copy_config()
-        elif choice == '6':
-            configs = load_configs()
-            config_idx = None
-            config = select_config(configs)
-            if not config:
-                continue
-            config_idx = configs.index(config) if config in configs else None
-            if not wait_for_dist(config['local_dist']):
-                continue
-            def try_ssh_connect(ssh, config, result_holder):
-                try:
-                    print(f"[DEBUG] 尝试连接 {config['host']}:{config['port']} 用户:{config['username']}")
-                    ssh.connect(
-                        hostname=config['host'],
-                        port=config['port'],
-                        username=config['username'],
-                        password=config['password'],
-                        timeout=15,
-                        banner_timeout=10,
-                        look_for_keys=False,
-                        allow_agent=False
-                    )
-                    result_holder['ok'] = True
-                except Exception as e:
-                    result_holder['error'] = str(e)
-            max_retries = 2
-            for retry_count in range(max_retries):
-                ssh = paramiko.SSHClient()
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                result_holder = {'ok': False, 'error': None}
-                t = threading.Thread(target=try_ssh_connect, args=(ssh, config, result_holder))
-                t.start()
-                t.join(20)
-                if t.is_alive():
-                    print(f"[ERROR] 连接服务器超时（20秒未响应），自动中断。")
-                    t.join(0.1)
-                    result_holder['error'] = 'Timeout'
-                if result_holder['ok']:
-                    print("连接成功！")
-                    break
-                else:
-                    print(f"[ERROR] 连接失败: {result_holder['error']}")
-                    print("请选择操作：1. 重新输入配置  2. 修改配置  3. 删除该配置  4. 跳过")
-                    op = input("输入序号: ").strip()
-                    if op == '1':
-                        # 重新输入所有配置项
-                        for key in ['host', 'port', 'username', 'password']:
-                            val = input(f"请输入 {key}（原值: {config.get(key)}）: ").strip()
-                            if val:
-                                if key == 'port':
-                                    config[key] = int(val)
-                                else:
-                                    config[key] = val
-                        if config_idx is not None:
-                            configs[config_idx] = config
-                            save_configs(configs)
-                        print("已更新配置，重新尝试连接...")
-                        continue
-                    elif op == '2':
-                        # 进入完整配置编辑模式
-                        for key in config:
-                            val = input(f"请输入 {key}（原值: {config.get(key)}，回车跳过）: ").strip()
-                            if val:
-                                if key == 'port':
-                                    config[key] = int(val)
-                                else:
-                                    config[key] = val
-                        if config_idx is not None:
-                            configs[config_idx] = config
-                            save_configs(configs)
-                        print("已修改配置，重新尝试连接...")
-                        continue
-                    elif op == '3':
-                        # 删除该配置
-                        if config_idx is not None:
-                            configs.pop(config_idx)
-                            save_configs(configs)
-                            print("已删除该配置。")
-                        break
-                    elif op == '4':
-                        print("跳过该配置。"); break
-                    else:
-                        print("无效输入，跳过该配置。"); break
-            else:
-                print("多次尝试后仍无法连接服务器。")
-                continue
-            try:
-                sftp_upload(config['local_dist'], config['remote_path'], ssh)
-                ssh.close()
-                print("删除本地 dist 目录...")
-                shutil.rmtree(config['local_dist'])
-                print("dist 目录已删除。")
-                print("打开浏览器测试页面...")
-                webbrowser.open(config['test_url'])
-                save_history_record(config)
-            except Exception as e:
-                print(f"部署失败: {str(e)}")
-        elif choice == '7':
-            list_history_records()
-        elif choice == '8':
-            delete_history_record()
-        elif choice == '9':
-            export_configs()
-        elif choice == '11':
+        if need_upgrade:
+            print("⚠️ 检测到脚本内容有更新或本地被修改，建议使用菜单12升级！")
+        sys.stdout.write(MENU_BODY)
+        choice = input("请选择操作: ").strip()
+        if choice == '11':
             print("退出。"); break
-        elif choice == '13':
-            configs = load_configs()
-            if not configs:
-                print("无配置。")
-                return
-            config = select_config(configs)
-            if not config:
-                return
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            print(f"[连接测试] 尝试连接 {config['host']}:{config['port']} 用户:{config['username']}")
-            try:
-                ssh.connect(
-                    hostname=config['host'],
-                    port=config['port'],
-                    username=config['username'],
-                    password=config['password'],
-                    timeout=15,
-                    banner_timeout=10,
-                    look_for_keys=False,
-                    allow_agent=False
-                )
-                print("[连接测试] SSH 连接成功！")
-                ssh.close()
-            except Exception as e:
-                print(f"[连接测试] SSH 连接失败: {e}")
-                import traceback
-                traceback.print_exc()
-        elif choice == '14':
-            print("请粘贴要导入的配置（支持 JSON 数组或单个对象）：")
-            import sys
-            try:
-                pasted = sys.stdin.read() if sys.stdin.isatty() else input()
-                import json
-                configs_to_import = json.loads(pasted)
-                if isinstance(configs_to_import, dict):
-                    configs_to_import = [configs_to_import]
-            except Exception as e:
-                print(f"导入内容格式错误: {e}，已返回菜单。")
-                return
-            required_fields = ["name","host","port","username","password","remote_path","local_dist","test_url"]
-            valid_configs = []
-            for idx, cfg in enumerate(configs_to_import):
-                # 字段校验
-                missing = [f for f in required_fields if f not in cfg or not cfg[f]]
-                if missing:
-                    print(f"第{idx+1}条配置缺少字段: {missing}，跳过")
-                    continue
-                # SSH 连接校验
-                ssh = paramiko.SSHClient()
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                try:
-                    ssh.connect(
-                        hostname=cfg['host'],
-                        port=int(cfg['port']),
-                        username=cfg['username'],
-                        password=cfg['password'],
-                        timeout=10,
-                        banner_timeout=5,
-                        look_for_keys=False,
-                        allow_agent=False
-                    )
-                    ssh.close()
-                    print(f"第{idx+1}条配置连接验证通过！")
-                    valid_configs.append(cfg)
-                except Exception as e:
-                    print(f"第{idx+1}条配置连接失败: {e}，跳过")
-            if valid_configs:
-                configs = load_configs()
-                configs.extend(valid_configs)
-                save_configs(configs)
-                print(f"成功导入 {len(valid_configs)} 条配置！")
-            else:
-                print("没有任何配置通过校验，导入失败！")
-        else:
+        handler = MENU_HANDLERS.get(choice)
+        if handler is None:
             print("无效选择，请重新输入！")
+            continue
+        if choice in MENU_MAP:
+            log_menu_usage(MENU_MAP[choice])
+        handler(store)
 
 if __name__ == "__main__":
     main_menu()